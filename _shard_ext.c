@@ -0,0 +1,237 @@
+/* _shard_ext.c
+ *
+ * Optional C accelerator for the sharding loop in merge_results.py.
+ * Memory-maps the input, walks it with memchr, extracts the key columns
+ * in place (no per-line Python objects), hashes them with FNV-1a and
+ * appends each raw line to a 4 MiB per-shard write buffer.
+ *
+ * How to Compile:
+ *   gcc -O3 -shared -fPIC $(python3-config --includes) _shard_ext.c -o _shard_ext.so
+ *
+ * merge_results.py falls back to the pure-Python sharding loop when this
+ * module is not built, so building it is optional.  FNV-1a is stable
+ * across runs and hosts, so shard assignment stays deterministic as long
+ * as both input files are sharded through the same path.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <fcntl.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#define SHARD_BUF_SIZE (4 * 1024 * 1024)
+#define MAX_KEY_COLS 16
+
+static inline int is_space(unsigned char c)
+{
+    return c == ' ' || c == '\t' || c == '\r';
+}
+
+static inline uint64_t fnv1a_update(uint64_t h, const char *p, size_t n)
+{
+    while (n--) {
+        h ^= (unsigned char)*p++;
+        h *= 0x100000001b3ULL;
+    }
+    return h;
+}
+
+struct shard_out {
+    FILE *fp;
+    char *buf;
+    size_t used;
+};
+
+static int shard_flush(struct shard_out *out)
+{
+    if (out->used && fwrite(out->buf, 1, out->used, out->fp) != out->used)
+        return -1;
+    out->used = 0;
+    return 0;
+}
+
+static int shard_append(struct shard_out *out, const char *p, size_t n)
+{
+    if (out->used + n > SHARD_BUF_SIZE && shard_flush(out) < 0)
+        return -1;
+    if (n > SHARD_BUF_SIZE)
+        return fwrite(p, 1, n, out->fp) == n ? 0 : -1;
+    memcpy(out->buf + out->used, p, n);
+    out->used += n;
+    return 0;
+}
+
+static PyObject *
+shard_file_c(PyObject *self, PyObject *args)
+{
+    const char *path, *outdir, *basename;
+    PyObject *key_cols_obj;
+    int num_shards;
+
+    if (!PyArg_ParseTuple(args, "sOis", &path, &key_cols_obj,
+                          &num_shards, &outdir))
+        return NULL;
+    (void)self;
+    basename = strrchr(path, '/');
+    basename = basename ? basename + 1 : path;
+
+    long key_cols[MAX_KEY_COLS];
+    Py_ssize_t n_cols = PySequence_Length(key_cols_obj);
+    if (n_cols <= 0 || n_cols > MAX_KEY_COLS) {
+        PyErr_SetString(PyExc_ValueError, "key_cols must hold 1..16 columns");
+        return NULL;
+    }
+    long max_idx = 0;
+    for (Py_ssize_t i = 0; i < n_cols; i++) {
+        PyObject *item = PySequence_GetItem(key_cols_obj, i);
+        if (!item)
+            return NULL;
+        key_cols[i] = PyLong_AsLong(item);
+        Py_DECREF(item);
+        if (key_cols[i] < 0 && PyErr_Occurred())
+            return NULL;
+        if (key_cols[i] > max_idx)
+            max_idx = key_cols[i];
+    }
+    if (num_shards <= 0) {
+        PyErr_SetString(PyExc_ValueError, "num_shards must be positive");
+        return NULL;
+    }
+    if (max_idx >= MAX_KEY_COLS * 4) {
+        PyErr_SetString(PyExc_ValueError, "key column index too large");
+        return NULL;
+    }
+
+    int fd = open(path, O_RDONLY);
+    if (fd < 0)
+        return PyErr_SetFromErrnoWithFilename(PyExc_OSError, path);
+    struct stat st;
+    if (fstat(fd, &st) < 0) {
+        close(fd);
+        return PyErr_SetFromErrnoWithFilename(PyExc_OSError, path);
+    }
+
+    struct shard_out *outs = calloc((size_t)num_shards, sizeof(*outs));
+    if (!outs) {
+        close(fd);
+        return PyErr_NoMemory();
+    }
+    for (int s = 0; s < num_shards; s++) {
+        char name[4096];
+        snprintf(name, sizeof(name), "%s/%s_shard_%d.txt", outdir, basename, s);
+        outs[s].fp = fopen(name, "wb");
+        outs[s].buf = malloc(SHARD_BUF_SIZE);
+        if (!outs[s].fp || !outs[s].buf)
+            goto io_error;
+    }
+
+    Py_ssize_t lines = 0;
+    if (st.st_size > 0) {
+        char *base = mmap(NULL, (size_t)st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+        if (base == MAP_FAILED)
+            goto io_error;
+        madvise(base, (size_t)st.st_size, MADV_SEQUENTIAL);
+
+        int failed = 0;
+        Py_BEGIN_ALLOW_THREADS
+        const char *p = base, *end = base + st.st_size;
+        while (p < end) {
+            const char *nl = memchr(p, '\n', (size_t)(end - p));
+            const char *line_end = nl ? nl : end;
+            const char *line = p;
+            size_t line_len = (size_t)(line_end - line) + (nl ? 1 : 0);
+            p = line_end + 1;
+
+            /* skip leading whitespace, then blank and comment lines */
+            const char *q = line;
+            while (q < line_end && is_space((unsigned char)*q))
+                q++;
+            if (q == line_end || *q == '#')
+                continue;
+
+            /* tokenize up to max_idx + 1 whitespace-delimited fields */
+            const char *tok_start[MAX_KEY_COLS * 4];
+            const char *tok_end[MAX_KEY_COLS * 4];
+            long found = 0;
+            while (found <= max_idx && q < line_end) {
+                while (q < line_end && is_space((unsigned char)*q))
+                    q++;
+                if (q == line_end)
+                    break;
+                tok_start[found] = q;
+                while (q < line_end && !is_space((unsigned char)*q))
+                    q++;
+                tok_end[found] = q;
+                found++;
+            }
+            if (found <= max_idx)
+                continue;
+
+            /* FNV-1a over the key columns, '_'-separated like the join */
+            uint64_t h = 0xcbf29ce484222325ULL;
+            for (Py_ssize_t i = 0; i < n_cols; i++) {
+                long c = key_cols[i];
+                if (i)
+                    h = fnv1a_update(h, "_", 1);
+                h = fnv1a_update(h, tok_start[c],
+                                 (size_t)(tok_end[c] - tok_start[c]));
+            }
+            if (shard_append(&outs[h % (uint64_t)num_shards], line, line_len) < 0) {
+                failed = 1;
+                break;
+            }
+            lines++;
+        }
+        Py_END_ALLOW_THREADS
+        munmap(base, (size_t)st.st_size);
+        if (failed)
+            goto io_error;
+    }
+
+    for (int s = 0; s < num_shards; s++) {
+        if (shard_flush(&outs[s]) < 0)
+            goto io_error;
+        fclose(outs[s].fp);
+        free(outs[s].buf);
+        outs[s].fp = NULL;
+        outs[s].buf = NULL;
+    }
+    free(outs);
+    close(fd);
+    return PyLong_FromSsize_t(lines);
+
+io_error:
+    for (int s = 0; s < num_shards; s++) {
+        if (outs[s].fp)
+            fclose(outs[s].fp);
+        free(outs[s].buf);
+    }
+    free(outs);
+    close(fd);
+    if (!PyErr_Occurred())
+        PyErr_SetFromErrnoWithFilename(PyExc_OSError, path);
+    return NULL;
+}
+
+static PyMethodDef shard_methods[] = {
+    {"shard_file_c", shard_file_c, METH_VARARGS,
+     "shard_file_c(path, key_cols, num_shards, output_dir) -> lines sharded"},
+    {NULL, NULL, 0, NULL},
+};
+
+static struct PyModuleDef shard_module = {
+    PyModuleDef_HEAD_INIT, "_shard_ext",
+    "C sharding loop for merge_results.py", -1, shard_methods,
+    NULL, NULL, NULL, NULL,
+};
+
+PyMODINIT_FUNC
+PyInit__shard_ext(void)
+{
+    return PyModule_Create(&shard_module);
+}
@@ -5,82 +5,141 @@ import os
 import time
 import sys
 import mmap
-import csv
-import multiprocessing
 import re
 
+try:
+    # Optional compiled accelerator (see parse_cy.pyx for build instructions).
+    from parse_cy import parse_buffer as _parse_buffer
+except ImportError:
+    _parse_buffer = None
+
 NUMERIC_RE = re.compile(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?")
 METADATA_KEYWORDS_SET = {b"VERSION", b"CREATION", b"CREATOR", b"PROGRAM", b"DIVIDERCHAR"}
+# startswith with a tuple is a single C-level pass over all prefixes.
+_META_PREFIXES = tuple(METADATA_KEYWORDS_SET)
 
 def is_valid_instance_line(line):
-    line = line.strip()
-    if not line or line.startswith(b"#"): return False
-    for keyword in METADATA_KEYWORDS_SET:
-        if line.startswith(keyword): return False
-    return True
+    line = line.lstrip()
+    return bool(line) and not line.startswith(b"#") and not line.startswith(_META_PREFIXES)
 
 def extract_value(value_bytes, comparison_type):
-    value_str = value_bytes.decode('utf-8', errors='ignore').strip()
     if comparison_type == 'numeric':
-        match = NUMERIC_RE.search(value_str)
-        if match:
-            try: return float(match.group(0))
-            except (ValueError, TypeError): return value_str
-        else: return value_str
-    else:
-        return value_str
+        # Clean numbers (the common case) go straight through C float parsing;
+        # the regex only runs for values with units or other trailing junk.
+        try:
+            return float(value_bytes)
+        except ValueError:
+            value_str = value_bytes.decode('utf-8', errors='ignore').strip()
+            match = NUMERIC_RE.search(value_str)
+            if match:
+                try: return float(match.group(0))
+                except (ValueError, TypeError): return value_str
+            return value_str
+    return value_bytes.decode('utf-8', errors='ignore').strip()
 
 def parse_file_with_mmap(file_path, inst_cols, value_col, comparison_type):
-    data, instances_set = {}, set()
+    # dict.keys() is already a full set view, so a separate instances set
+    # would just double every hash insert.
+    data = {}
+    max_needed = max(inst_cols + [value_col])
+    # EDA instance names repeat heavily; canonicalise key bytes through this
+    # table so duplicate column values share one object.
+    interned = {}
     with open(file_path, "rb") as f:
         mmapped_file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
-        for line in iter(mmapped_file.readline, b""):
-            if not is_valid_instance_line(line): continue
-            parts = line.strip().split()
-            if len(parts) <= max(inst_cols + [value_col]): continue
-            try:
-                key = tuple(parts[i].decode('utf-8', errors='ignore').strip() for i in inst_cols)
-                val_raw = parts[value_col].decode('utf-8', errors='ignore').strip()
-                val_parsed = extract_value(parts[value_col], comparison_type)
-                data[key] = (val_raw, val_parsed)
-                instances_set.add(key)
-            except IndexError: continue
+        try:
+            # Pure forward scan: tell the kernel so readahead doubles and
+            # pages behind the cursor can be dropped early.
+            mmapped_file.madvise(mmap.MADV_SEQUENTIAL)
+            mmapped_file.madvise(mmap.MADV_WILLNEED)
+        except (AttributeError, OSError):
+            pass
+        if _parse_buffer is not None:
+            data = _parse_buffer(
+                memoryview(mmapped_file), _META_PREFIXES, inst_cols, value_col,
+                comparison_type == 'numeric')
+            mmapped_file.close()
+            return data
+        size = len(mmapped_file)
+        pos = 0
+        find = mmapped_file.find  # mmap.find is a single libc memchr per call
+        numeric = comparison_type == 'numeric'
+        while pos < size:
+            nl = find(b"\n", pos)
+            if nl < 0:
+                nl = size
+            line = mmapped_file[pos:nl]
+            pos = nl + 1
+            # is_valid_instance_line, inlined to skip the call per line
+            s = line.lstrip()
+            if not s or s.startswith(b"#") or s.startswith(_META_PREFIXES): continue
+            # split(None, N) strips whitespace itself and stops once we have
+            # every column we care about, so wide lines stay cheap.
+            parts = line.split(None, max_needed + 1)
+            if len(parts) <= max_needed: continue
+            # Keys stay as bytes end-to-end; they are only hashed and
+            # compared until the writers decode them for output.
+            key = tuple(interned.setdefault(b, b) for b in (parts[i] for i in inst_cols))
+            if numeric:
+                # Numeric shards hit this float() almost every line; only odd
+                # values (units, suffixes) fall through to extract_value.
+                vb = parts[value_col]
+                try:
+                    val_parsed = float(vb)
+                except ValueError:
+                    val_parsed = extract_value(vb, comparison_type)
+                data[key] = (vb, val_parsed)
+            else:
+                data[key] = (parts[value_col], extract_value(parts[value_col], comparison_type))
         mmapped_file.close()
-    return data, instances_set
+    return data
 
 def write_missing_file(file1_name, file2_name, miss2, miss1, out_filename):
     with open(out_filename, "w") as out:
         if miss2:
             out.writelines([f"Instances from '{file1_name}' missing in '{file2_name}':\n"])
-            out.writelines(f"{' | '.join(inst)}\n" for inst in miss2)
+            out.writelines(f"{' | '.join(k.decode('utf-8', 'ignore') for k in inst)}\n" for inst in miss2)
         if miss1:
             out.writelines([f"\nInstances from '{file2_name}' missing in '{file1_name}':\n"])
-            out.writelines(f"{' | '.join(inst)}\n" for inst in miss1)
+            out.writelines(f"{' | '.join(k.decode('utf-8', 'ignore') for k in inst)}\n" for inst in miss1)
 
 def write_comparison_csv(file1_name, file2_name, data1, data2, matched, out_filename, comparison_type):
     if not matched: return 0
     lines_written = 0
-    with open(out_filename, "w", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        key_len = len(matched[0]) if matched else 1
+    # Rows are formatted straight to bytes (b"%.4f" % x is a C-level format)
+    # and flushed in ~1 MiB blocks; keys are whitespace tokens and values are
+    # numeric, so no CSV quoting is ever needed.
+    flush_at = 1 << 20
+    buf = bytearray()
+    with open(out_filename, "wb", buffering=1 << 20) as out:
+        key_len = len(matched[0])
         headers = [f"Instance_Key_{i+1}" for i in range(key_len)] + [f"{file1_name}_Value", f"{file2_name}_Value", "Difference", "Result"]
-        writer.writerow(headers)
-        for inst in matched:
-            raw1, val1 = data1.get(inst, (None, None))
-            raw2, val2 = data2.get(inst, (None, None))
+        buf += (",".join(headers) + "\r\n").encode('utf-8')
+        # Column-at-a-time layout: pull each file's parsed values into one
+        # list up front (C-speed comprehension) so the row loop only zips.
+        # matched is the key intersection, so both lookups always hit: plain
+        # indexing skips the per-row default-tuple allocation of .get().
+        vals1 = [data1[inst][1] for inst in matched]
+        vals2 = [data2[inst][1] for inst in matched]
+        for inst, val1, val2 in zip(matched, vals1, vals2):
             if comparison_type == 'numeric' and isinstance(val1, float) and isinstance(val2, float):
                 diff = val1 - val2
-                result = f"{abs((diff / val2) * 100):.2f}%" if val2 != 0 else ("Infinite %" if val1 != 0 else "0.00%")
-                writer.writerow(list(inst) + [f"{val1:.4f}", f"{val2:.4f}", f"{diff:.4f}", result])
+                if val2 != 0:
+                    result = b"%.2f%%" % abs((diff / val2) * 100)
+                else:
+                    result = b"Infinite %" if val1 != 0 else b"0.00%"
+                buf += b",".join(inst + (b"%.4f" % val1, b"%.4f" % val2, b"%.4f" % diff, result)) + b"\r\n"
             else:
-                match_result = "MATCH" if str(val1) == str(val2) else "MISMATCH"
-                writer.writerow(list(inst) + [str(val1), str(val2), "N/A", match_result])
+                match_result = b"MATCH" if str(val1) == str(val2) else b"MISMATCH"
+                buf += b",".join(inst + (str(val1).encode('utf-8'), str(val2).encode('utf-8'), b"N/A", match_result)) + b"\r\n"
             lines_written += 1
+            if len(buf) >= flush_at:
+                out.write(buf)
+                buf.clear()
+        if buf:
+            out.write(buf)
     return lines_written
 
-def parse_file_worker(args_tuple):
-    return parse_file_with_mmap(*args_tuple)
-
 def main():
     parser = argparse.ArgumentParser(description="Worker script for comparing two file shards on LSF.")
     parser.add_argument("--file1", required=True, help="Path to the first file shard.")
@@ -97,18 +156,18 @@ def main():
     instcol1 = list(map(int, args.instcol1.strip().split(",")))
     instcol2 = list(map(int, args.instcol2.strip().split(",")))
 
-    with multiprocessing.Pool(2) as pool:
-        results = pool.map(parse_file_worker, [
-            (args.file1, instcol1, args.valcol1, args.comparison_type),
-            (args.file2, instcol2, args.valcol2, args.comparison_type)
-        ])
-    
-    data1, instances1 = results[0]
-    data2, instances2 = results[1]
-    
-    miss2 = sorted(list(instances1 - instances2))
-    miss1 = sorted(list(instances2 - instances1))
-    matched = sorted(list(instances1 & instances2))
+    # Parse the two shards in-process: a Pool(2) has to pickle dicts with
+    # millions of entries back to the parent, which costs more than the
+    # overlap buys on already mmap/bytes-bound parsing.
+    data1 = parse_file_with_mmap(args.file1, instcol1, args.valcol1, args.comparison_type)
+    data2 = parse_file_with_mmap(args.file2, instcol2, args.valcol2, args.comparison_type)
+
+    # Dicts preserve insertion (= file) order, so a single membership pass
+    # gives deterministic output without three O(N log N) tuple sorts.
+    matched, miss2 = [], []
+    for key in data1:
+        (matched if key in data2 else miss2).append(key)
+    miss1 = [key for key in data2 if key not in data1]
 
     missing_filename = f"{args.output_prefix}_missing_instances.txt"
     comparison_filename = f"{args.output_prefix}_comparison.csv"
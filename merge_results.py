@@ -1,68 +1,336 @@
-# File: launch_comparison.py
-# Purpose: The main script to start the entire process with robust error handling.
+# File: merge_results.py
+# Purpose: Shard/submit helpers plus the result-merging step used by the launchers.
 import os
 import argparse
+import mmap
+import shutil
 import subprocess
 import time
 import re
-import merge_results # We will call the merge script directly
+import concurrent.futures
+import functools
 
-def get_instance_key(line, key_cols):
+try:
+    # Optional compiled accelerator (see _shard_ext.c for build instructions).
+    from _shard_ext import shard_file_c as _shard_file_c
+except ImportError:
+    _shard_file_c = None
+
+try:
+    import xxhash
+    _key_hash = xxhash.xxh3_64_intdigest  # ~10 GB/s and stable across runs
+except ImportError:
+    from zlib import crc32 as _key_hash   # stdlib fallback, also stable and C-speed
+
+@functools.lru_cache(maxsize=65536)
+def _shard_of(key, num_shards):
+    """Shard index for a key; cached because EDA reports are usually sorted
+    by instance, so adjacent lines repeat keys and hit the cache instead of
+    rehashing."""
+    return _key_hash(key) % num_shards
+
+# Below this size mmap setup costs more than it saves; use buffered reads.
+MMAP_THRESHOLD = 10 * 1024 * 1024
+
+def _preallocate(fds, expected_size):
+    """Reserves extents for each shard output up front where supported.
+
+    Growing N interleaved output files line by line forces the filesystem
+    to extend every extent tree over and over; one fallocate per shard
+    (10% over the even split) does it in a single metadata operation.
+    Callers ftruncate down to the real size when they finish.
+    """
+    if not hasattr(os, "posix_fallocate") or expected_size <= 0:
+        return
+    for fd in fds:
+        try:
+            os.posix_fallocate(fd, 0, int(expected_size * 1.1))
+        except OSError:
+            return  # filesystem without fallocate support; writes still work
+
+def _iter_lines(f):
+    """Yields raw lines (with newlines) from an open binary file.
+
+    Large files are memory-mapped and walked with mmap.find, which is a
+    single libc memchr per line and hands back slices without readline
+    buffering; small files fall back to chunked buffered reads.
+    """
+    size = os.fstat(f.fileno()).st_size
+    if size >= MMAP_THRESHOLD:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        except (AttributeError, OSError):
+            pass
+        try:
+            pos = 0
+            find = mm.find
+            while pos < size:
+                nl = find(b"\n", pos)
+                if nl < 0:
+                    yield mm[pos:size]
+                    break
+                yield mm[pos:nl + 1]
+                pos = nl + 1
+        finally:
+            mm.close()
+        return
+    pending = b""
+    while True:
+        chunk = f.read(64 * 1024 * 1024)
+        if not chunk:
+            break
+        lines = (pending + chunk).splitlines(keepends=True)
+        if lines and not lines[-1].endswith(b"\n"):
+            pending = lines.pop()
+        else:
+            pending = b""
+        yield from lines
+    if pending:
+        yield pending
+
+def get_instance_key(line, key_cols, max_idx):
     """Extracts the key from a line for sharding."""
-    parts = line.strip().split()
-    if len(parts) <= max(key_cols):
+    # split(None, N) strips whitespace itself and stops tokenizing once the
+    # columns we need are out, so wide lines don't cost a full token list.
+    parts = line.split(None, max_idx + 1)
+    if len(parts) <= max_idx:
         return None
-    return "_".join(parts[i] for i in key_cols)
+    # Keys are almost always 1 or 2 columns; both sizes skip the
+    # generator + join machinery entirely.
+    n = len(key_cols)
+    if n == 1:
+        return parts[key_cols[0]]
+    if n == 2:
+        return parts[key_cols[0]] + b"_" + parts[key_cols[1]]
+    return b"_".join(parts[i] for i in key_cols)
 
-def shard_file(input_file, key_cols, num_shards, output_dir):
-    """Reads a large file and splits it into smaller shards based on a key."""
+def _make_keyfn(key_cols):
+    """Builds a key extractor specialised for this run's key columns.
+
+    key_cols is fixed at launch, so generating the function with the
+    indices hardcoded (partial evaluation) removes the per-line generator
+    and join machinery: a single-column key compiles down to one subscript.
+    """
+    max_idx = max(key_cols)
+    expr = ' + b"_" + '.join(f"parts[{i}]" for i in key_cols)
+    src = (
+        f"def _keyfn(line):\n"
+        f"    parts = line.split(None, {max_idx + 1})\n"
+        f"    if len(parts) <= {max_idx}:\n"
+        f"        return None\n"
+        f"    return {expr}\n"
+    )
+    namespace = {}
+    exec(src, namespace)
+    return namespace["_keyfn"]
+
+def _find_chunk_offsets(input_file, num_chunks):
+    """Splits the file into newline-aligned byte ranges, one per worker."""
+    file_size = os.path.getsize(input_file)
+    if file_size == 0:
+        return []
+    chunk_size = max(1, file_size // num_chunks)
+    offsets = [0]
+    with open(input_file, "rb") as f:
+        for i in range(1, num_chunks):
+            f.seek(chunk_size * i)
+            f.readline()  # advance to the next line boundary
+            pos = f.tell()
+            if pos >= file_size:
+                break
+            if pos > offsets[-1]:
+                offsets.append(pos)
+    offsets.append(file_size)
+    return list(zip(offsets, offsets[1:]))
+
+def _shard_range(input_file, start, end, key_cols, num_shards, output_dir, worker_id, skip_comments=True):
+    """Worker: shards one byte range into per-worker part files."""
+    keyfn = _make_keyfn(key_cols)
+    basename = os.path.basename(input_file)
+    flush_at = 4 * 1024 * 1024
+    fds = [os.open(os.path.join(output_dir, f"{basename}_shard_{s}_part_{worker_id}.txt"),
+                   os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644) for s in range(num_shards)]
+    _preallocate(fds, (end - start) // num_shards)
+    bufs = [bytearray() for _ in range(num_shards)]
+    written = [0] * num_shards
+    try:
+        with open(input_file, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for line in mm[start:end].splitlines(keepends=True):
+                    if skip_comments:
+                        # One byte test covers comments and blank lines; only
+                        # lines starting with whitespace pay for the strip().
+                        c = line[0]
+                        if c == 0x23 or c == 0x0A or c == 0x0D:  # '#', '\n', '\r'
+                            continue
+                        if c == 0x20 or c == 0x09:  # ' ', '\t'
+                            stripped = line.strip()
+                            if not stripped or stripped.startswith(b"#"):
+                                continue
+                    key = keyfn(line)
+                    if key is None:
+                        continue
+                    shard_index = _shard_of(key, num_shards)
+                    buf = bufs[shard_index]
+                    buf += line
+                    if len(buf) >= flush_at:
+                        written[shard_index] += os.write(fds[shard_index], buf)
+                        buf.clear()
+            finally:
+                mm.close()
+        for s, (fd, buf) in enumerate(zip(fds, bufs)):
+            if buf:
+                written[s] += os.write(fd, buf)
+            os.ftruncate(fd, written[s])  # drop any unused preallocated tail
+    finally:
+        # Close in a finally so buffers never leak fds on an exception.
+        for fd in fds:
+            os.close(fd)
+
+def _shard_file_parallel(input_file, key_cols, num_shards, output_dir, num_workers, skip_comments=True):
+    """Shards byte ranges in worker processes, then concatenates the parts."""
+    ranges = _find_chunk_offsets(input_file, num_workers)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as pool:
+        futures = [pool.submit(_shard_range, input_file, start, end, key_cols,
+                               num_shards, output_dir, w, skip_comments)
+                   for w, (start, end) in enumerate(ranges)]
+        for future in futures:
+            future.result()
+    # Stitch each shard back together in worker order so the line order
+    # matches what the serial loop would have produced.
+    basename = os.path.basename(input_file)
+    for s in range(num_shards):
+        with open(os.path.join(output_dir, f"{basename}_shard_{s}.txt"), "wb", buffering=0) as out:
+            for w in range(len(ranges)):
+                part = os.path.join(output_dir, f"{basename}_shard_{s}_part_{w}.txt")
+                with open(part, "rb") as f_in:
+                    _append_file(out, f_in)
+                os.remove(part)
+
+def shard_file(input_file, key_cols, num_shards, output_dir, skip_comments=True):
+    """Reads a large file and splits it into smaller shards based on a key.
+
+    skip_comments=False drops the per-line comment/blank filter for inputs
+    known to contain only data lines, saving the check on every line.
+    """
     print(f"-> Processing {input_file}...")
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         print(f"-> Created output directory: '{output_dir}'")
 
-    output_files = [open(os.path.join(output_dir, f"{os.path.basename(input_file)}_shard_{i}.txt"), "w") for i in range(num_shards)]
+    if _shard_file_c is not None:
+        # The C loop never builds per-line Python objects: it scans the
+        # mmap'd file with memchr, hashes the key columns with FNV-1a and
+        # flushes 4 MiB per-shard buffers.
+        try:
+            _shard_file_c(input_file, key_cols, num_shards, output_dir)
+        except OSError as e:
+            print(f"  ❌ ERROR: {e}")
+            return False
+        print(f"-> Finished sharding {input_file}.")
+        return True
+
+    # Sharding is embarrassingly parallel: big files get split into
+    # newline-aligned byte ranges, one worker each, writing per-worker
+    # part files the parent stitches together. The stable key hash keeps
+    # shard assignment identical to the serial loop.
+    num_workers = os.cpu_count() or 1
+    if num_workers > 1 and os.path.exists(input_file) and os.path.getsize(input_file) >= MMAP_THRESHOLD:
+        _shard_file_parallel(input_file, key_cols, num_shards, output_dir, num_workers, skip_comments)
+        print(f"-> Finished sharding {input_file}.")
+        return True
+
+    # Binary mode end to end: no per-line decode on multi-GB ASCII inputs.
+    # Raw fds plus explicit per-shard accumulators: lines pile up in a
+    # bytearray and go out in one big write(2) per ~4 MiB instead of one
+    # buffered write per line.
+    flush_at = 4 * 1024 * 1024
+    fds = [os.open(os.path.join(output_dir, f"{os.path.basename(input_file)}_shard_{i}.txt"),
+                   os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644) for i in range(num_shards)]
+    try:
+        _preallocate(fds, os.path.getsize(input_file) // num_shards)
+    except OSError:
+        pass  # missing input is reported by the read loop below
+    bufs = [bytearray() for _ in range(num_shards)]
+    written = [0] * num_shards
 
+    keyfn = _make_keyfn(key_cols)
     try:
-        with open(input_file, "r", errors='ignore') as f:
+        try:
+            f = open(input_file, "rb")
+        except FileNotFoundError:
+            print(f"  ❌ ERROR: Input file not found: {input_file}")
+            return False
+        with f:
             line_count = 0
-            for line in f:
+            for line in _iter_lines(f):
                 line_count += 1
                 if line_count % 5000000 == 0:
                     print(f"   ...processed {line_count // 1000000}M lines of {os.path.basename(input_file)}")
-                if not line.strip() or line.strip().startswith("#"):
-                    continue
-                key = get_instance_key(line, key_cols)
+                if skip_comments:
+                    # One byte test covers comments and blank lines; only
+                    # lines starting with whitespace pay for the strip().
+                    c = line[0]
+                    if c == 0x23 or c == 0x0A or c == 0x0D:  # '#', '\n', '\r'
+                        continue
+                    if c == 0x20 or c == 0x09:  # ' ', '\t'
+                        stripped = line.strip()
+                        if not stripped or stripped.startswith(b"#"):
+                            continue
+                key = keyfn(line)
                 if key is None:
                     continue
-                shard_index = hash(key) % num_shards
-                output_files[shard_index].write(line)
-    except FileNotFoundError:
-        print(f"  ❌ ERROR: Input file not found: {input_file}")
-        for file_handle in output_files:
-            file_handle.close()
-        return False
-
-    for file_handle in output_files:
-        file_handle.close()
+                # Never use built-in hash() here: it is salted per
+                # interpreter run, so re-sharding the same input would
+                # assign lines to different shards every time.
+                shard_index = _shard_of(key, num_shards)
+                buf = bufs[shard_index]
+                buf += line
+                if len(buf) >= flush_at:
+                    written[shard_index] += os.write(fds[shard_index], buf)
+                    buf.clear()
+        for s, (fd, buf) in enumerate(zip(fds, bufs)):
+            if buf:
+                written[s] += os.write(fd, buf)
+            os.ftruncate(fd, written[s])  # drop any unused preallocated tail
+    finally:
+        # Close in a finally so an exception mid-loop cannot leak N fds or
+        # leave shard files missing their final flush silently truncated.
+        for fd in fds:
+            os.close(fd)
     print(f"-> Finished sharding {input_file}.")
     return True
 
-def monitor_jobs(job_ids):
+def monitor_jobs(job_ids, poll_min=15, poll_max=300):
     """Monitors LSF jobs until they are all done."""
     if not job_ids: return
     print("\n--- Part 4: Monitoring LSF Jobs ---")
+    # Exponential backoff: poll quickly while jobs are finishing, stretch
+    # the interval out while nothing changes so long runs don't hammer
+    # mbatchd every 30 s for hours.
+    interval = poll_min
+    last_finished = 0
     while True:
         try:
-            result = subprocess.run(f"bjobs -o 'jobid stat' {' '.join(job_ids)}", shell=True, check=True, capture_output=True, text=True)
+            # One batched bjobs per poll covers every job, and the argv form
+            # skips the shell fork.
+            result = subprocess.run(["bjobs", "-o", "jobid stat", *job_ids], check=True, capture_output=True, text=True)
             output = result.stdout.strip().split('\n')
-            
+
             # Count how many jobs are in DONE or EXIT status
             finished_count = sum(1 for line in output if 'DONE' in line or 'EXIT' in line)
             total_jobs = len(job_ids)
-            
-            print(f"\r-> Monitoring... {finished_count}/{total_jobs} jobs complete. (Checking again in 30s)", end="")
-            
+
+            if finished_count > last_finished:
+                interval = poll_min
+                last_finished = finished_count
+            else:
+                interval = min(interval * 1.5, poll_max)
+
+            print(f"\r-> Monitoring... {finished_count}/{total_jobs} jobs complete. (Checking again in {interval:.0f}s)", end="")
+
             if finished_count == total_jobs:
                 print("\n✅ All jobs have finished.")
                 break
@@ -70,24 +338,135 @@ def monitor_jobs(job_ids):
             # This error can happen if bjobs finds no running jobs, meaning they are all done.
             print("\n✅ All jobs have finished.")
             break
-        time.sleep(30)
+        time.sleep(interval)
 
-def get_job_report(job_id):
-    """Gets the runtime and memory usage for a completed job from bhist."""
+def get_job_reports(job_ids):
+    """Gets runtime and memory usage for completed jobs from one bhist call.
+
+    bhist accepts multiple job ids, so a single subprocess replaces one
+    fork+exec per job; the output is split on its per-job section headers.
+    """
+    reports = {job_id: ("N/A (check logs)", "N/A (check logs)") for job_id in job_ids}
     try:
-        result = subprocess.run(f"bhist -l {job_id}", shell=True, check=True, capture_output=True, text=True)
-        output = result.stdout
-        runtime_match = re.search(r"Total CPU time used is\s+([\d.]+)\s+seconds", output)
+        result = subprocess.run(["bhist", "-l", *job_ids], check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError:
+        return reports
+    # Sections look like "Job <12345>, User <...>, ..." — or "Job <12345[3]>"
+    # for array elements.
+    pieces = re.split(r"Job <(\d+(?:\[\d+\])?)>", result.stdout)
+    for job_id, section in zip(pieces[1::2], pieces[2::2]):
+        if job_id not in reports:
+            continue
+        runtime_match = re.search(r"Total CPU time used is\s+([\d.]+)\s+seconds", section)
         runtime = float(runtime_match.group(1)) if runtime_match else "N/A"
-        mem_match = re.search(r"MAX MEM:\s+([\d.]+\s+[KMG]B);", output)
+        mem_match = re.search(r"MAX MEM:\s+([\d.]+\s+[KMG]B);", section)
         memory = mem_match.group(1).strip() if mem_match else "N/A"
-        return runtime, memory
-    except (subprocess.CalledProcessError, AttributeError):
-        return "N/A (check logs)", "N/A (check logs)"
+        reports[job_id] = (runtime, memory)
+    return reports
+
+def _append_file(final_out, src, offset=0):
+    """Appends src (starting at offset) to final_out without touching the bytes in Python."""
+    size = os.fstat(src.fileno()).st_size
+    try:
+        # os.sendfile copies inside the kernel: no read/decode/encode round trip.
+        while offset < size:
+            sent = os.sendfile(final_out.fileno(), src.fileno(), offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+    except (AttributeError, OSError):
+        # Portable fallback: hand the kernel a memory-mapped view of the shard
+        # so the write still avoids building a Python bytes copy of the file.
+        try:
+            with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                final_out.write(memoryview(mm)[offset:])
+        except (ValueError, OSError):  # zero-length file or mmap unavailable
+            src.seek(offset)
+            shutil.copyfileobj(src, final_out, 1 << 20)
+
+def _copy_range(src_path, src_offset, dst_fd, dst_offset, length):
+    """Copies one partial into its slot of the final file with pread/pwrite."""
+    chunk = 16 * 1024 * 1024
+    with open(src_path, "rb") as src:
+        src_fd = src.fileno()
+        remaining = length
+        while remaining > 0:
+            data = os.pread(src_fd, min(chunk, remaining), src_offset)
+            if not data:
+                break
+            os.pwrite(dst_fd, data, dst_offset)
+            src_offset += len(data)
+            dst_offset += len(data)
+            remaining -= len(data)
+
+def _parallel_concat(sources, final_filename):
+    """Concatenates (path, start_offset) sources into final_filename.
+
+    Every source gets a disjoint region of the ftruncate'd output, so the
+    thread pool copies them concurrently with positioned I/O and no locks;
+    threads are enough because pread/pwrite release the GIL.
+    """
+    tasks = []
+    total = 0
+    for path, start in sources:
+        length = os.path.getsize(path) - start
+        if length > 0:
+            tasks.append((path, start, total, length))
+            total += length
+    final_fd = os.open(final_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(final_fd, total)
+        if tasks:
+            workers = min(8, len(tasks))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_copy_range, path, start, final_fd, offset, length)
+                           for path, start, offset, length in tasks]
+                for future in futures:
+                    future.result()
+    finally:
+        os.close(final_fd)
+
+def merge_csv_files(num_shards, prefix, final_filename):
+    """Concatenates the per-shard comparison CSVs, keeping a single header row."""
+    print(f"-> Merging comparison CSVs into '{final_filename}'...")
+    sources = []
+    for i in range(num_shards):
+        partial = f"{prefix}_{i}_comparison.csv"
+        if not os.path.exists(partial):
+            continue
+        with open(partial, "rb") as f_in:
+            header = f_in.readline()
+        if not header:
+            continue
+        # The first partial contributes its header; the rest start past theirs.
+        sources.append((partial, 0 if not sources else len(header)))
+    if not sources:
+        print("  ❌ ERROR: No partial comparison CSVs were found to merge.")
+        return False
+    _parallel_concat(sources, final_filename)
+    return True
+
+def merge_txt_files(num_shards, prefix, final_filename):
+    """Concatenates the per-shard missing-instances reports."""
+    print(f"-> Merging missing-instance reports into '{final_filename}'...")
+    sources = []
+    for i in range(num_shards):
+        partial = f"{prefix}_{i}_missing_instances.txt"
+        if os.path.exists(partial):
+            sources.append((partial, 0))
+    if not sources:
+        print("  ❌ ERROR: No partial missing-instance files were found to merge.")
+        return False
+    _parallel_concat(sources, final_filename)
+    return True
 
 def main():
     """Guides the user, shards files, submits LSF jobs, monitors, and merges."""
     parser = argparse.ArgumentParser(description="Fully automated script to shard files, submit comparison jobs to LSF, monitor progress, and merge results.")
+    parser.add_argument("--poll-min", type=float, default=15, help="Initial seconds between bjobs polls (default: 15).")
+    parser.add_argument("--poll-max", type=float, default=300, help="Backoff cap in seconds between bjobs polls (default: 300).")
+    parser.add_argument("--assume-no-comments", action="store_true",
+                        help="Skip the per-line comment/blank filter for inputs that contain only data lines.")
     args = parser.parse_args()
 
     print("--- LSF Comparison Job Launcher (Interactive & Automated) ---")
@@ -119,8 +498,9 @@ def main():
     instcol1 = list(map(int, instcol1_str.split(',')))
     instcol2 = list(map(int, instcol2_str.split(',')))
     
-    if not shard_file(file1, instcol1, shards, shards_dir): return
-    if not shard_file(file2, instcol2, shards, shards_dir): return
+    skip_comments = not args.assume_no_comments
+    if not shard_file(file1, instcol1, shards, shards_dir, skip_comments): return
+    if not shard_file(file2, instcol2, shards, shards_dir, skip_comments): return
     print("✅ Sharding complete.")
 
     # --- Part 3: Automatically submit jobs to LSF ---
@@ -141,66 +521,73 @@ def main():
 
     file1_basename = os.path.basename(file1)
     file2_basename = os.path.basename(file2)
-    job_ids = []
 
-    for i in range(shards):
-        # Construct all paths as absolute to ensure LSF can find them
-        log_path = os.path.join(logs_dir, f"output_{i}.log")
-        file1_shard_path = os.path.join(shards_dir, f"{file1_basename}_shard_{i}.txt")
-        file2_shard_path = os.path.join(shards_dir, f"{file2_basename}_shard_{i}.txt")
-        output_prefix_path = os.path.join(results_dir, f"run_{i}")
-
-        bsub_command = (
-            f"bsub -n 2 -R 'rusage[mem=16G]' -o '{log_path}' "
-            f"{python_command} {compare_script_path} "
-            f"--file1 '{file1_shard_path}' "
-            f"--file2 '{file2_shard_path}' "
-            f"--instcol1 '{instcol1_str}' --valcol1 {valcol1} "
-            f"--instcol2 '{instcol2_str}' --valcol2 {valcol2} "
-            f"--output_prefix '{output_prefix_path}'"
+    # One job array instead of N bsub invocations: a single submission
+    # transaction covers every shard, and $LSB_JOBINDEX (1-based) picks the
+    # shard inside a small generated wrapper script.
+    wrapper_path = os.path.join(script_dir, "run_shard.sh")
+    with open(wrapper_path, "w") as wrapper:
+        wrapper.write(
+            "#!/bin/sh\n"
+            "# Generated by merge_results.py: one LSF array element per shard.\n"
+            "IDX=$((LSB_JOBINDEX - 1))\n"
+            f"exec {python_command} {compare_script_path} \\\n"
+            f"    --file1 '{shards_dir}/{file1_basename}_shard_'$IDX'.txt' \\\n"
+            f"    --file2 '{shards_dir}/{file2_basename}_shard_'$IDX'.txt' \\\n"
+            f"    --instcol1 '{instcol1_str}' --valcol1 {valcol1} \\\n"
+            f"    --instcol2 '{instcol2_str}' --valcol2 {valcol2} \\\n"
+            f"    --output_prefix '{results_dir}/run_'$IDX\n"
         )
-        
-        try:
-            print(f"-> Submitting job for shard {i}...")
-            result = subprocess.run(bsub_command, shell=True, check=True, capture_output=True, text=True)
-            match = re.search(r"Job <(\d+)>", result.stdout)
-            if match:
-                job_id = match.group(1)
-                job_ids.append(job_id)
-                print(f"   ...Success! Job ID: {job_id}")
-            else:
-                print(f"  ERROR: Could not parse Job ID from bsub output. Full output:\n{result.stdout}")
-        except subprocess.CalledProcessError as e:
-            # This is the enhanced error reporting block
-            print("\n" + "="*80)
-            print(f"❌ ERROR: The 'bsub' command failed for shard {i}. LSF rejected the job.")
-            print("This is often due to an issue with your LSF environment or the command parameters.")
-            print("Please review the details below. You may need to consult your LSF administrator.")
-            print("="*80)
-            print(f"\n[INFO] Failed Command:\n{bsub_command}\n")
-            print(f"[INFO] Exit Code: {e.returncode}")
-            print(f"\n[INFO] LSF Output (stdout):\n{e.stdout}")
-            print(f"\n[INFO] LSF Error (stderr):\n{e.stderr}")
-            print("\n" + "="*80)
-            print("Common reasons for failure:")
-            print("  1. The Python path is incorrect for the LSF nodes.")
-            print("  2. The resource request (-R 'rusage[mem=16G]') is invalid for your queues.")
-            print("  3. You do not have permission to submit to the default LSF queue.")
-            print("  4. A file path in the command is incorrect or not accessible from LSF nodes.")
-            break
+
+    bsub_command = [
+        "bsub", "-J", f"compare[1-{shards}]", "-n", "2", "-R", "rusage[mem=16G]",
+        "-o", os.path.join(logs_dir, "output_%I.log"), "sh", wrapper_path,
+    ]
+
+    job_ids = []
+    try:
+        print(f"-> Submitting job array for {shards} shards...")
+        result = subprocess.run(bsub_command, check=True, capture_output=True, text=True)
+        match = re.search(r"Job <(\d+)>", result.stdout)
+        if match:
+            array_id = match.group(1)
+            # Track the array elements as individual ids; bjobs and bhist
+            # both accept the NNN[i] form.
+            job_ids = [f"{array_id}[{i + 1}]" for i in range(shards)]
+            print(f"   ...Success! Job ID: {array_id}")
+        else:
+            print(f"  ERROR: Could not parse Job ID from bsub output. Full output:\n{result.stdout}")
+    except subprocess.CalledProcessError as e:
+        # This is the enhanced error reporting block
+        print("\n" + "="*80)
+        print("❌ ERROR: The 'bsub' command failed. LSF rejected the job array.")
+        print("This is often due to an issue with your LSF environment or the command parameters.")
+        print("Please review the details below. You may need to consult your LSF administrator.")
+        print("="*80)
+        print(f"\n[INFO] Failed Command:\n{' '.join(bsub_command)}\n")
+        print(f"[INFO] Exit Code: {e.returncode}")
+        print(f"\n[INFO] LSF Output (stdout):\n{e.stdout}")
+        print(f"\n[INFO] LSF Error (stderr):\n{e.stderr}")
+        print("\n" + "="*80)
+        print("Common reasons for failure:")
+        print("  1. The Python path is incorrect for the LSF nodes.")
+        print("  2. The resource request (-R 'rusage[mem=16G]') is invalid for your queues.")
+        print("  3. You do not have permission to submit to the default LSF queue.")
+        print("  4. A file path in the command is incorrect or not accessible from LSF nodes.")
 
     if len(job_ids) != shards:
-        print("\n❌ Could not submit all jobs. Please check the LSF errors above. Exiting.")
+        print("\n❌ Could not submit the job array. Please check the LSF errors above. Exiting.")
         return
 
     # --- Part 4: Monitor Jobs ---
-    monitor_jobs(job_ids)
+    monitor_jobs(job_ids, poll_min=args.poll_min, poll_max=args.poll_max)
 
     # --- Part 5: Generate Final Report ---
     print("\n--- Part 5: Final Job Report ---")
     total_runtime = 0.0
+    reports = get_job_reports(job_ids)
     for i, job_id in enumerate(job_ids):
-        runtime, memory = get_job_report(job_id)
+        runtime, memory = reports[job_id]
         if isinstance(runtime, float):
             total_runtime += runtime
         print(f"  - Shard {i} (Job {job_id}): Runtime={runtime}s, Max Memory={memory}")
@@ -212,8 +599,8 @@ def main():
     final_csv = "final_comparison.csv"
     final_txt = "final_missing_instances.txt"
 
-    csv_ok = merge_results.merge_csv_files(shards, prefix, final_csv)
-    txt_ok = merge_results.merge_txt_files(shards, prefix, final_txt)
+    csv_ok = merge_csv_files(shards, prefix, final_csv)
+    txt_ok = merge_txt_files(shards, prefix, final_txt)
 
     if csv_ok and txt_ok:
         print("\n✅ Workflow complete! Your final files are ready:")
@@ -0,0 +1,87 @@
+# parse_cy.pyx
+#
+# Optional Cython accelerator for the parse loop in compare_adv.py.
+# Scans the whole file buffer with memchr instead of Python-level
+# splitlines/split, and only materialises the columns we actually need.
+#
+# How to Compile:
+#   cythonize -i -3 parse_cy.pyx
+#
+# compare_adv.py falls back to the pure-Python parser when this module
+# is not built, so building it is optional.
+
+from libc.string cimport memchr
+from libc.stdlib cimport strtod
+
+cdef inline bint _is_space(unsigned char c):
+    return c == 0x20 or c == 0x09 or c == 0x0D
+
+def parse_buffer(const unsigned char[::1] buf, meta_prefixes, inst_cols, int value_col, bint numeric):
+    """Parse a whole file buffer; returns the data dict like the Python loop."""
+    cdef Py_ssize_t n = buf.shape[0]
+    cdef Py_ssize_t pos = 0, nl, i, tok_start, tok_end, ncols
+    cdef const unsigned char* base = &buf[0] if n else NULL
+    cdef const unsigned char* p
+    cdef int max_needed = value_col
+    cdef double d
+    cdef char* endptr
+
+    for c in inst_cols:
+        if c > max_needed:
+            max_needed = c
+    ncols = max_needed + 1
+
+    data = {}
+    starts = [0] * ncols
+    ends = [0] * ncols
+
+    while pos < n:
+        p = <const unsigned char*> memchr(base + pos, 0x0A, n - pos)
+        nl = (p - base) if p != NULL else n
+
+        # skip leading whitespace
+        i = pos
+        while i < nl and _is_space(buf[i]):
+            i += 1
+        pos_line = i
+        pos = nl + 1
+        if pos_line == nl:
+            continue
+        if buf[pos_line] == 0x23:  # '#'
+            continue
+        line = bytes(buf[pos_line:nl])
+        if line.startswith(meta_prefixes):
+            continue
+
+        # tokenize only the first ncols fields
+        i = pos_line
+        found = 0
+        while found < ncols and i < nl:
+            while i < nl and _is_space(buf[i]):
+                i += 1
+            if i == nl:
+                break
+            tok_start = i
+            while i < nl and not _is_space(buf[i]):
+                i += 1
+            starts[found] = tok_start
+            ends[found] = i
+            found += 1
+        if found < ncols:
+            continue
+
+        # Keys stay as bytes; compare_adv.py decodes them at output time.
+        key = tuple(bytes(buf[starts[c]:ends[c]]) for c in inst_cols)
+        val_bytes = bytes(buf[starts[value_col]:ends[value_col]])
+        val_raw = val_bytes.decode('utf-8', 'ignore')
+        if numeric:
+            # strtod parses a leading numeric prefix straight from the bytes,
+            # standing in for the NUMERIC_RE + float() path.
+            val_nul = val_bytes + b'\x00'
+            d = strtod(<const char*> val_nul, &endptr)
+            val_parsed = d if endptr != <char*> val_nul else val_raw
+        else:
+            val_parsed = val_raw
+        data[key] = (val_bytes, val_parsed)
+
+    return data
@@ -1,51 +1,147 @@
 # start_run.py
+import concurrent.futures
+import os
 import sys
 import subprocess
+import threading
 import time
+import queue
 import re
 from pathlib import Path
 
+try:
+    import xxhash
+    _key_hash = xxhash.xxh3_64_intdigest  # ~10 GB/s and stable across runs
+except ImportError:
+    from zlib import crc32 as _key_hash   # stdlib fallback, also stable and C-speed
+
 # --- Helper Functions for Sharding (moved from sharder.py) ---
 
 def get_line_count(file_path):
     """Counts the number of lines in a file and reports it."""
     print(f"Counting lines in {file_path.name}...")
     try:
-        with open(file_path, "r", errors='ignore') as f:
-            count = sum(1 for _ in f)
+        # Count newlines over raw 1 MiB chunks: bytes.count is a C-level
+        # scan, so nothing is decoded and no per-line objects are built.
+        count = 0
+        last = b"\n"
+        with open(file_path, "rb", buffering=0) as f:
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk:
+                    break
+                count += chunk.count(b"\n")
+                last = chunk[-1:]
+        if last != b"\n":
+            count += 1  # final line without a trailing newline
         print(f"-> Found {count:,} lines.")
         return count
     except FileNotFoundError:
         print(f"❌ Error: File not found at {file_path}", file=sys.stderr)
         return None
 
-def get_instance_key(line, key_cols):
-    """Extracts the key from a line."""
-    parts = line.strip().split()
-    if len(parts) <= max(key_cols):
+def get_instance_key(line, key_cols, max_idx):
+    """Extracts the key bytes from a line."""
+    # split(None, N) strips whitespace itself and stops tokenizing once the
+    # key columns are out.
+    parts = line.split(None, max_idx + 1)
+    if len(parts) <= max_idx:
         return None
-    return "_".join(parts[i] for i in key_cols)
+    # 0x1f (unit separator) cannot appear inside a whitespace token, so
+    # joined keys never collide with a single-column key.
+    return b"\x1f".join(parts[i] for i in key_cols)
+
+def _writev_all(fd, iov):
+    """writev the whole iovec list, finishing any partial write."""
+    written = os.writev(fd, iov)
+    total = sum(len(b) for b in iov)
+    if written != total:
+        rest = memoryview(b"".join(iov))[written:]
+        while rest:
+            rest = rest[os.write(fd, rest):]
 
 def shard_file(input_file, key_cols, num_shards, output_dir):
     """Reads a large file and splits it into smaller shards based on a key."""
     print(f"Sharding {input_file.name}...")
-    
-    output_files = [open(output_dir / f"{input_file.name}_shard_{i}.txt", "w") for i in range(num_shards)]
-    
-    with open(input_file, "r", errors='ignore') as f:
-        for line in f:
-            if not line.strip() or line.strip().startswith("#"):
-                continue
-            
-            key = get_instance_key(line, key_cols)
-            if key is None:
-                continue
 
-            shard_index = hash(key) % num_shards
-            output_files[shard_index].write(line)
-            
-    for file_handle in output_files:
-        file_handle.close()
+    # Bytes end to end: no TextIOWrapper decode/encode per line. Each shard
+    # gathers line objects in an iovec list and hands them to the kernel in
+    # one writev per ~1 MiB — no join copy and one syscall per flush.
+    flush_at = 1 << 20
+    iov_max = 1024  # IOV_MAX ceiling for a single writev
+    out_fds = [
+        os.open(str(output_dir / f"{input_file.name}_shard_{i}.txt"),
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        for i in range(num_shards)
+    ]
+    iovs = [[] for _ in range(num_shards)]
+    iov_bytes = [0] * num_shards
+    max_idx = max(key_cols)
+    # A power-of-two shard count can mask instead of dividing.
+    is_pow2 = num_shards & (num_shards - 1) == 0
+    mask = num_shards - 1
+
+    # A dedicated reader thread keeps the next 8 MiB chunks coming while
+    # this thread tokenizes and routes the current one, hiding disk latency
+    # behind parse work; the bounded queue caps memory at ~4 chunks.
+    chunk_queue = queue.Queue(maxsize=4)
+
+    def _reader(f):
+        try:
+            while True:
+                chunk = f.read(8 << 20)
+                if not chunk:
+                    break
+                chunk_queue.put(chunk)
+        finally:
+            chunk_queue.put(None)
+
+    try:
+        with open(input_file, "rb") as f:
+            reader = threading.Thread(target=_reader, args=(f,), daemon=True)
+            reader.start()
+            pending = b""
+            while True:
+                chunk = chunk_queue.get()
+                if chunk is None:
+                    break
+                lines = (pending + chunk).splitlines(keepends=True)
+                if lines and not lines[-1].endswith(b"\n"):
+                    pending = lines.pop()
+                else:
+                    pending = b""
+                for line in lines:
+                    stripped = line.strip()
+                    if not stripped or stripped.startswith(b"#"):
+                        continue
+
+                    key = get_instance_key(line, key_cols, max_idx)
+                    if key is None:
+                        continue
+
+                    # Built-in hash() is salted per interpreter run, which
+                    # made shard assignment non-reproducible between runs.
+                    h = _key_hash(key)
+                    shard_index = (h & mask) if is_pow2 else (h % num_shards)
+                    iov = iovs[shard_index]
+                    iov.append(line)
+                    iov_bytes[shard_index] += len(line)
+                    if iov_bytes[shard_index] >= flush_at or len(iov) >= iov_max:
+                        _writev_all(out_fds[shard_index], iov)
+                        iov.clear()
+                        iov_bytes[shard_index] = 0
+            reader.join()
+            if pending:
+                stripped = pending.strip()
+                if stripped and not stripped.startswith(b"#"):
+                    key = get_instance_key(pending, key_cols, max_idx)
+                    if key is not None:
+                        iovs[_key_hash(key) % num_shards].append(pending)
+    finally:
+        for fd, iov in zip(out_fds, iovs):
+            if iov:
+                _writev_all(fd, iov)
+            os.close(fd)
     print(f"-> Finished sharding {input_file.name}.")
 
 # --- New function for interactive setup ---
@@ -145,41 +241,69 @@ def submit_and_monitor(config):
 
     print("\n>>> All jobs submitted. Now monitoring completion...")
     print("----------------------------------------------------")
-    
-    completed_jobs = set()
-    while len(completed_jobs) < len(job_ids):
-        for job_id in job_ids:
-            if job_id in completed_jobs: continue
 
-            status_output = subprocess.run(['bjobs', '-o', 'stat', '-noheader', job_id], capture_output=True, text=True)
-            status = status_output.stdout.strip()
-            
-            if status in ["DONE", "EXIT"]:
-                print(f"✅ Job {job_id} (shard {job_ids[job_id]['shard']}) completed with status: {status}.")
-                
-                job_report = ""
-                for _ in range(3):
-                    time.sleep(3)
-                    report_proc = subprocess.run(['bacct', '-l', job_id], capture_output=True, text=True)
-                    if report_proc.returncode == 0 and "Accounting information about job" in report_proc.stdout:
-                        job_report = report_proc.stdout
-                        break
-                
-                cpu_time_match = re.search(r"CPU time\s*:\s*([\d.]+)\s*sec", job_report, re.IGNORECASE)
-                mem_match = re.search(r"Max Memory\s*:\s*([\d.]+\s*[GMK]?B)", job_report, re.IGNORECASE)
-                cpu_time = f"{cpu_time_match.group(1)} seconds" if cpu_time_match else "N/A"
-                max_mem = mem_match.group(1).strip() if mem_match else "N/A"
+    def _fetch_report(job_id):
+        """Retries bacct for a finished job and parses CPU/memory out of it."""
+        job_report = ""
+        for _ in range(3):
+            time.sleep(3)
+            report_proc = subprocess.run(['bacct', '-l', job_id], capture_output=True, text=True)
+            if report_proc.returncode == 0 and "Accounting information about job" in report_proc.stdout:
+                job_report = report_proc.stdout
+                break
 
+        cpu_time_match = re.search(r"CPU time\s*:\s*([\d.]+)\s*sec", job_report, re.IGNORECASE)
+        mem_match = re.search(r"Max Memory\s*:\s*([\d.]+\s*[GMK]?B)", job_report, re.IGNORECASE)
+        cpu_time = f"{cpu_time_match.group(1)} seconds" if cpu_time_match else "N/A"
+        max_mem = mem_match.group(1).strip() if mem_match else "N/A"
+        return cpu_time, max_mem
+
+    def _drain_reports(report_futures, wait=False):
+        for job_id in list(report_futures):
+            future = report_futures[job_id]
+            if wait or future.done():
+                cpu_time, max_mem = future.result()
+                print(f"📊 Job {job_id} (shard {job_ids[job_id]['shard']}) report:")
                 print(f"   - CPU Time: {cpu_time}")
                 print(f"   - Max Memory: {max_mem}")
                 print("----------------------------------------------------")
+                del report_futures[job_id]
+
+    completed_jobs = set()
+    report_futures = {}
+    # bacct sleeps up to 9 s per job; run it on a small thread pool so a
+    # burst of completions in one tick doesn't stall the status polling.
+    report_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+    while len(completed_jobs) < len(job_ids):
+        # One batched bjobs per tick covers every job still pending instead
+        # of forking a subprocess per job; jobs missing from the output have
+        # already left the queue.
+        pending = [job_id for job_id in job_ids if job_id not in completed_jobs]
+        status_output = subprocess.run(['bjobs', '-o', 'jobid stat', '-noheader', *pending], capture_output=True, text=True)
+        statuses = {}
+        for status_line in status_output.stdout.splitlines():
+            fields = status_line.split()
+            if len(fields) >= 2:
+                statuses[fields[0]] = fields[1]
+
+        for job_id in pending:
+            status = statuses.get(job_id, "")
+
+            if status in ["DONE", "EXIT"]:
+                print(f"✅ Job {job_id} (shard {job_ids[job_id]['shard']}) completed with status: {status}.")
+                report_futures[job_id] = report_pool.submit(_fetch_report, job_id)
                 completed_jobs.add(job_id)
-            elif not status and job_id not in completed_jobs:
+            elif not status:
                 completed_jobs.add(job_id)
 
+        _drain_reports(report_futures)
+
         if len(completed_jobs) < len(job_ids):
             time.sleep(15)
 
+    _drain_reports(report_futures, wait=True)
+    report_pool.shutdown()
+
     print("\nAll comparison jobs are complete. You can now run the merge script.")
 
 # --- Main Execution Block ---
@@ -215,8 +339,15 @@ def main():
         instcol1 = list(map(int, config['instcol1'].split(',')))
         instcol2 = list(map(int, config['instcol2'].split(',')))
         
-        shard_file(config['file1'], instcol1, config['shards'], shards_dir)
-        shard_file(config['file2'], instcol2, config['shards'], shards_dir)
+        # The two files shard independently into disjoint outputs, so run
+        # them in parallel worker processes instead of back to back.
+        with concurrent.futures.ProcessPoolExecutor(max_workers=2) as pool:
+            futures = [
+                pool.submit(shard_file, config['file1'], instcol1, config['shards'], shards_dir),
+                pool.submit(shard_file, config['file2'], instcol2, config['shards'], shards_dir),
+            ]
+            for future in futures:
+                future.result()
 
         print("\n>>> STEP 2: Sharding Complete.")
         
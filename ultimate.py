@@ -1,10 +1,12 @@
 import argparse
+import functools
+import io
+import multiprocessing
 import os
 import time
 import sys
 import mmap
 import csv
-import multiprocessing
 import re
 
 METADATA_KEYWORDS = {
@@ -14,107 +16,165 @@ METADATA_KEYWORDS = {
     b"RP_PIN_NAME", b"MICRON_UNITS", b"INST_NAME"
 }
 METADATA_KEYWORDS_SET = set(METADATA_KEYWORDS)
+# One anchored alternation instead of 18 startswith calls per line; the
+# regex engine walks the line once however many keywords there are.
+_META_RE = re.compile(b"^(?:" + b"|".join(re.escape(k) for k in METADATA_KEYWORDS) + b")")
 
 def is_valid_instance_line(line):
     line = line.strip()
-    if not line or line.startswith(b"#"):
-        return False
-    for keyword in METADATA_KEYWORDS_SET:
-        if line.startswith(keyword):
-            return False
-    return True
+    return bool(line) and not line.startswith(b"#") and _META_RE.match(line) is None
 
+@functools.lru_cache(maxsize=1 << 16)
 def extract_value(value_bytes):
-    value_str = value_bytes.decode('utf-8', errors='ignore').strip()
-    # If it's a clean float, parse it
-    if re.fullmatch(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?", value_str):
-        try:
-            return float(value_str)
-        except ValueError:
-            pass
-    return value_str  # Return as string if not float
+    # Value columns are often low-cardinality (cell names, a handful of
+    # discrete floats), so an lru_cache keyed on the raw bytes skips the
+    # repeat float() parses; high-cardinality files just cycle the cache.
+    # float() is a single C call and accepts bytes directly; running a
+    # regex over every value to pre-screen it cost more than the parse.
+    try:
+        return float(value_bytes)
+    except ValueError:
+        return value_bytes.decode('utf-8', errors='ignore').strip()  # not a float
 
-def parse_file_with_mmap(file_path, inst_cols, value_col):
+def parse_file_with_mmap(file_path, inst_cols, value_col, start=0, end=None):
     data = {}
     instances_set = set()
+    line_count = 0
+    max_idx = max(inst_cols + [value_col])
+    # Compile a key builder specialized to these exact column indexes:
+    # straight-line subscripts, no generator or index loop per row.
+    # Keys stay bytes: split() tokens carry no whitespace and hashing
+    # bytes skips the per-field decode; output code decodes at the end.
+    src = "def _make_key(parts): return (" + "".join(
+        "parts[%d], " % i for i in inst_cols) + ")"
+    ns = {}
+    exec(src, ns)
+    make_key = ns["_make_key"]
     with open(file_path, "rb") as f:
         mmapped_file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
-        chunk_size = 1024 * 1024
-        buffer = b""
-        while True:
-            chunk = mmapped_file.read(chunk_size)
-            if not chunk:
-                break
-            buffer += chunk
-            lines = buffer.split(b"\n")
-            buffer = lines.pop()
-            for line in lines:
-                if not is_valid_instance_line(line):
-                    continue
-                parts = line.strip().split()
-                if len(parts) <= max(inst_cols + [value_col]):
-                    continue
-                try:
-                    key = tuple(parts[i].decode('utf-8', errors='ignore').strip() for i in inst_cols)
-                    val_raw = parts[value_col].decode('utf-8', errors='ignore').strip()
-                    val_parsed = extract_value(parts[value_col])
-                    data[key] = (val_raw, val_parsed)
-                    instances_set.add(key)
-                except:
-                    continue
-        if buffer:
-            parts = buffer.strip().split()
-            if len(parts) > max(inst_cols + [value_col]):
-                try:
-                    key = tuple(parts[i].decode('utf-8', errors='ignore').strip() for i in inst_cols)
-                    val_raw = parts[value_col].decode('utf-8', errors='ignore').strip()
-                    val_parsed = extract_value(parts[value_col])
-                    data[key] = (val_raw, val_parsed)
-                    instances_set.add(key)
-                except:
-                    pass
+        try:
+            # Strictly sequential scan: ask for aggressive readahead
+            # instead of the kernel's default heuristics.
+            mmapped_file.madvise(mmap.MADV_SEQUENTIAL)
+            mmapped_file.madvise(mmap.MADV_WILLNEED)
+        except (AttributeError, OSError):
+            pass  # pre-3.8 or non-POSIX; advice is best-effort
+        size = len(mmapped_file) if end is None else end
+        find = mmapped_file.find  # one libc memchr per call
+        pos = start
+        while pos < size:
+            nl = find(b"\n", pos)
+            if nl < 0:
+                nl = size
+            line = mmapped_file[pos:nl]
+            pos = nl + 1
+            line_count += 1
+            if not is_valid_instance_line(line):
+                continue
+            # Stop splitting after the last column we actually use; the
+            # remainder of a wide line stays one unsplit bytes object.
+            # split(None, n) also ignores surrounding whitespace, so the
+            # separate strip() is redundant.
+            parts = line.split(None, max_idx + 1)
+            if len(parts) <= max_idx:
+                continue
+            # The length guard above makes every subscript safe, decode
+            # with errors='ignore' cannot raise, and extract_value traps
+            # its own ValueError — so no exception frame per line.
+            key = make_key(parts)
+            val_raw = parts[value_col].decode('utf-8', errors='ignore')
+            val_parsed = extract_value(parts[value_col])
+            data[key] = (val_raw, val_parsed)
+            instances_set.add(key)
         mmapped_file.close()
-    return data, instances_set
+    return data, instances_set, line_count
+
+def _parse_range(args):
+    return parse_file_with_mmap(*args)
+
+def parse_file_parallel(file_path, inst_cols, value_col):
+    # Split the file at newline boundaries into one chunk per core and
+    # parse the chunks in worker processes; the pages are shared through
+    # the page cache, so each worker just mmaps its own slice of them.
+    size = os.path.getsize(file_path)
+    num_chunks = multiprocessing.cpu_count()
+    if num_chunks <= 1 or size < (1 << 20):
+        return parse_file_with_mmap(file_path, inst_cols, value_col)
+    bounds = [0]
+    with open(file_path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for i in range(1, num_chunks):
+            target = i * size // num_chunks
+            if target <= bounds[-1]:
+                continue
+            nl = mm.find(b"\n", target)
+            if nl < 0:
+                break
+            bounds.append(nl + 1)
+        mm.close()
+    bounds.append(size)
+    ranges = [(file_path, inst_cols, value_col, s, e)
+              for s, e in zip(bounds, bounds[1:]) if s < e]
+    data = {}
+    instances_set = set()
+    line_count = 0
+    with multiprocessing.Pool(processes=len(ranges)) as pool:
+        # Merge in chunk order so a key that repeats across chunks still
+        # resolves last-wins, exactly like the sequential scan.
+        for part_data, part_set, part_lines in pool.map(_parse_range, ranges):
+            data.update(part_data)
+            instances_set.update(part_set)
+            line_count += part_lines
+    return data, instances_set, line_count
 
 def compare_instances(data1, data2, instances1, instances2):
-    missing_in_file2 = sorted([i for i in instances1 if i not in instances2])
-    missing_in_file1 = sorted([i for i in instances2 if i not in instances1])
-    matched = sorted(list(instances1 & instances2))
+    # Set difference runs the whole membership scan in C; the list
+    # comprehensions did one interpreted lookup per key.
+    missing_in_file2 = sorted(instances1 - instances2)
+    missing_in_file1 = sorted(instances2 - instances1)
+    matched = sorted(instances1 & instances2)
     return missing_in_file2, missing_in_file1, matched
 
 def write_missing_file(file1_name, file2_name, miss2, miss1):
-    with open("missing_instances.txt", "w") as out:
-        out.writelines([
-            f"{'='*60}\n",
-            f"Instances missing from {file2_name}:\n",
-            f"{'='*60}\n",
-        ])
-        out.writelines(f"{' | '.join(inst)}\n" for inst in miss2)
-        out.writelines([
-            f"\n{'='*60}\n",
-            f"Instances missing from {file1_name}:\n",
-            f"{'='*60}\n",
-        ])
-        out.writelines(f"{' | '.join(inst)}\n" for inst in miss1)
+    # Assemble the whole report with one join, encode once and write
+    # once, instead of a file.write per freshly built f-string.
+    sep = "=" * 60
+    parts = [sep, f"Instances missing from {file2_name}:", sep]
+    parts.extend(" | ".join(p.decode('utf-8', 'ignore') for p in inst) for inst in miss2)
+    parts.extend(["", sep, f"Instances missing from {file1_name}:", sep])
+    parts.extend(" | ".join(p.decode('utf-8', 'ignore') for p in inst) for inst in miss1)
+    with open("missing_instances.txt", "wb") as out:
+        out.write("\n".join(parts).encode("utf-8") + b"\n")
 
 def write_comparison_csv(file1_name, file2_name, data1, data2, matched, col_name1, col_name2):
-    with open("comparison.csv", "w", newline="") as csvfile:
+    # No pandas on the grid hosts, so no to_csv C loop; batching rows
+    # through writerows with '%'-formatting over a 1 MiB buffer is the
+    # closest stdlib gets, and it cuts the per-row writer overhead.
+    raw = open("comparison.csv", "wb", buffering=1 << 20)
+    with io.TextIOWrapper(raw, encoding="utf-8", newline="") as csvfile:
         writer = csv.writer(csvfile)
         key_len = len(matched[0]) if matched else 1
         headers = [f"Key_{i+1}" for i in range(key_len)] + [
             f"{file1_name}_{col_name1}", f"{file2_name}_{col_name2}", "Difference", "Deviation / Match"
         ]
         writer.writerow(headers)
+        rows = []
         for inst in matched:
             raw1, val1 = data1[inst]
             raw2, val2 = data2[inst]
+            key_cells = [p.decode('utf-8', 'ignore') for p in inst]
             if isinstance(val1, float) and isinstance(val2, float):
                 diff = val1 - val2
                 deviation = (diff / val2) * 100 if val2 != 0 else float('inf')
-                writer.writerow(list(inst) + [f"{val1:.4f}", f"{val2:.4f}", f"{diff:.4f}", f"{deviation:.2f}%"])
+                rows.append(key_cells + ['%.4f' % val1, '%.4f' % val2, '%.4f' % diff, '%.2f%%' % deviation])
             else:
                 match = "YES" if raw1 == raw2 else "NO"
-                writer.writerow(list(inst) + [raw1, raw2, "N/A", match])
+                rows.append(key_cells + [raw1, raw2, "N/A", match])
+            if len(rows) >= 65536:
+                writer.writerows(rows)
+                rows.clear()
+        if rows:
+            writer.writerows(rows)
 
 def get_column_name(file_path, col_index):
     with open(file_path, 'r') as f:
@@ -127,20 +187,6 @@ def get_column_name(file_path, col_index):
                     return f"Column {col_index + 1}"
     return f"Column {col_index + 1}"
 
-def count_lines(path):
-    with open(path, 'rb') as f:
-        count = 0
-        chunk_size = 1024 * 1024
-        while True:
-            chunk = f.read(chunk_size)
-            if not chunk:
-                break
-            count += chunk.count(b'\n')
-    return count
-
-def parse_file_worker(args):
-    return parse_file_with_mmap(*args)
-
 def main():
     parser = argparse.ArgumentParser(description="Compare two files and report missing instances + CSV comparison")
     parser.add_argument("--file1", help="Path to first file")
@@ -183,17 +229,13 @@ def main():
     print(f"  • From {file2_name}: {col_name2} (Column {args.valcol2 + 1})")
 
     t0 = time.time()
-    lines1 = count_lines(args.file1)
-    lines2 = count_lines(args.file2)
-
-    with multiprocessing.Pool(2) as pool:
-        results = pool.map(parse_file_worker, [
-            (args.file1, instcol1, args.valcol1),
-            (args.file2, instcol2, args.valcol2)
-        ])
 
-    data1, instances1 = results[0]
-    data2, instances2 = results[1]
+    # One file at a time, but each one chunk-parallel across every core;
+    # that beats the old one-process-per-file split, which capped a
+    # multi-GB parse at a single worker.  Line counts come out of the
+    # same pass, so nothing reads the files twice.
+    data1, instances1, lines1 = parse_file_parallel(args.file1, instcol1, args.valcol1)
+    data2, instances2, lines2 = parse_file_parallel(args.file2, instcol2, args.valcol2)
 
     miss2, miss1, matched = compare_instances(data1, data2, instances1, instances2)
 
@@ -213,4 +255,4 @@ def main():
     print(f"  • Time elapsed         : {t1 - t0:.4f} seconds")
 
 if __name__ == "__main__":
-    m
+    main()